@@ -213,7 +213,7 @@ class Conversation:
         return msg_per_year
 
 
-#This allow to create a single haetmap for all the messages but the result doesn't look that good
+#Messages per day grouped by 'month-year', the full history heatmap (create_heatmap_calendar) uses get_message_per_day_as_dict instead
     def get_message_per_day(self):
         msg_per_day = {}
         for msg in self.messages:
@@ -12,7 +12,7 @@ import pandas as pd
 import seaborn as sns
 
 from colour import Color
-from PIL import Image
+from PIL import Image, ImageDraw, ImageFont
 from conv import Conversation
 from matplotlib.offsetbox import OffsetImage,AnnotationBbox
 
@@ -129,47 +129,121 @@ def create_pie_chart(values, labels, title, name):
 
 
 #Data should be a 2D array of month (y axes) and day (x axes)
-def create_heatmap(data, title, name):
+def create_heatmap(data, title, name, annot=True):
     months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
     days = list(range(1, 32))
-    
-    #Create a custom color map because out data are not linear
-    hc = ['#ffffff', '#bad6eb', '#89bedc', '#539ecd', '#2b7bba', '#052647']
-    th = [0, 0.001, 0.25, 0.5, 0.75, 1]
-    cdict = NonLinCdict(th, hc)
-    cm = matplotlib.colors.LinearSegmentedColormap('custom_blue', cdict)
 
     fig, ax = plt.subplots(figsize=(16,8), dpi=300)
     df = pd.DataFrame(data, index=months, columns=days)
     plt.tight_layout()
-    ax = sns.heatmap(df, cmap=cm, annot=True, fmt='d', linewidths=.7, square=True, cbar_kws={'label': 'Number of messages'}, ax=ax)
+    ax = sns.heatmap(df, cmap=HEATMAP_CMAP, annot=annot, fmt='d', linewidths=.7, square=True, cbar_kws={'label': 'Number of messages'}, ax=ax)
     ax.figure.axes[-1].yaxis.label.set_size(20)
     ax.set_title(title, pad=50, fontsize=16)
     ax.get_figure().savefig(name)
     plt.cla()
 
 
-#This allow to create a single haetmap for all the messages but the result doesn't look that good
-def create_heatmap_full_years(data, title, name):
-    y = []
-    x = list(range(1, 32))
-    data_2d = []
-    data_sorted = sorted(data.items(), key=lambda x: datetime.datetime.strptime(x[0], "%m-%Y"))
-    for item in data_sorted:
-        y.append(item[0])
-        data_2d.append(item[1])
-    #Create a custom color map because out data are not linear
-    hc = ['#ffffff', '#bad6eb', '#89bedc', '#539ecd', '#2b7bba', '#052647']
-    th = [0, 0.001, 0.25, 0.5, 0.75, 1]
-    cdict = NonLinCdict(th, hc)
-    cm = matplotlib.colors.LinearSegmentedColormap('custom_blue', cdict)
-    fig, ax = plt.subplots(figsize=(16,8 * (len(data_sorted) / 12)), dpi=300)
-    df = pd.DataFrame(data_2d, index=y, columns=x)
-    #plt.tight_layout()
-    ax = sns.heatmap(df, cmap=cm, annot=True, fmt='d', linewidths=.7, square=True, cbar_kws={'label': 'Number of messages'}, ax=ax)
-    ax.figure.axes[-1].yaxis.label.set_size(20)
-    ax.set_title(title, pad=50, fontsize=16)
-    ax.get_figure().savefig(name)
+#Data should be a dict of 'YYYY-MM-DD': number of messages (see Conversation.get_message_per_day_as_dict)
+#Each year is a block of 7 weekdays (rows) by 54 weeks (columns) like the GitHub contribution calendar
+#The pixels are written directly with numpy and saved with PIL, the figure size only depends on cell_size
+def create_heatmap_calendar(data, title, name, annot=False, cell_size=24):
+    if len(data) == 0:
+        return
+    items = sorted(data.items())
+    msg_days = np.array([item[0] for item in items], dtype='datetime64[D]')
+    msg_counts = np.array([item[1] for item in items])
+    first_year = msg_days[0].astype('datetime64[Y]').astype(int) + 1970
+    last_year = msg_days[-1].astype('datetime64[Y]').astype(int) + 1970
+    number_of_years = last_year - first_year + 1
+
+    #Every day of the covered years, including the ones without any message
+    all_days = np.arange(np.datetime64('{}-01-01'.format(first_year)), np.datetime64('{}-01-01'.format(last_year + 1)))
+    counts = np.zeros(len(all_days))
+    counts[(msg_days - all_days[0]).astype(int)] = msg_counts
+    year_start = all_days.astype('datetime64[Y]').astype('datetime64[D]')
+    #1970-01-01 was a Thursday, this gives 0 for Monday
+    weekday = (all_days.astype(int) + 3) % 7
+    start_weekday = (year_start.astype(int) + 3) % 7
+    week = ((all_days - year_start).astype(int) + start_weekday) // 7
+    year_index = all_days.astype('datetime64[Y]').astype(int) + 1970 - first_year
+
+    #Each year block has one header row (for the months name) followed by the 7 weekdays
+    block_height = 8
+    rows = year_index * block_height + 1 + weekday
+    grid = np.full((number_of_years * block_height, 54), np.nan)
+    grid[rows, week] = counts
+    is_day = ~np.isnan(grid)
+    vmax = max(np.max(msg_counts), 1)
+
+    #Upscale every cell to a square of pixels with a white border
+    cells = np.full(grid.shape + (3,), 255, dtype=np.uint8)
+    cells[is_day] = calendar_colors(grid[is_day], vmax)
+    pixels = np.repeat(np.repeat(cells, cell_size, axis=0), cell_size, axis=1)
+    pixels[np.isin(np.arange(pixels.shape[0]) % cell_size, [0, cell_size - 1])] = 255
+    pixels[:, np.isin(np.arange(pixels.shape[1]) % cell_size, [0, cell_size - 1])] = 255
+
+    font_path = matplotlib.font_manager.findfont('DejaVu Sans')
+    title_font = ImageFont.truetype(font_path, cell_size)
+    year_font = ImageFont.truetype(font_path, cell_size * 3 // 4)
+    label_font = ImageFont.truetype(font_path, cell_size // 2)
+    left = cell_size * 3
+    top = cell_size * (len(title.split('\n')) + 1)
+    grid_width = pixels.shape[1]
+    grid_height = pixels.shape[0]
+    img = Image.new('RGB', (left + grid_width + cell_size * 6, top + grid_height + cell_size // 2), 'white')
+    img.paste(Image.fromarray(pixels), (left, top))
+    draw = ImageDraw.Draw(img)
+    draw.multiline_text((img.size[0] // 2, cell_size // 2), title, font=title_font, fill='black', anchor='ma', align='center')
+
+    months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+    for i in range(number_of_years):
+        year = first_year + i
+        block_top = top + i * block_height * cell_size
+        draw.text((left - cell_size // 4, block_top + cell_size), str(year), font=year_font, fill='black', anchor='rd')
+        for weekday_index, weekday_name in [(0, 'Mon'), (2, 'Wed'), (4, 'Fri')]:
+            y = block_top + (weekday_index + 1.5) * cell_size
+            draw.text((left - cell_size // 4, y), weekday_name, font=label_font, fill='black', anchor='rm')
+        for month_index, month in enumerate(months):
+            first_day = np.datetime64('{}-{:02d}-01'.format(year, month_index + 1))
+            x = left + week[(first_day - all_days[0]).astype(int)] * cell_size
+            draw.text((x, block_top + cell_size - 2), month, font=label_font, fill='black', anchor='ld')
+
+    #One text per day is the slow part (~0.2ms each), so we refuse to annotate more than a few years
+    number_of_annotations = np.count_nonzero(is_day & (grid > 0))
+    if annot and number_of_annotations > CALENDAR_MAX_ANNOTATIONS:
+        print('Too many days to annotate the calendar ({} > {}), skipping the annotations'.format(number_of_annotations, CALENDAR_MAX_ANNOTATIONS))
+    elif annot:
+        annot_font = ImageFont.truetype(font_path, cell_size * 3 // 8)
+        for row, col in zip(*np.nonzero(is_day & (grid > 0))):
+            color = 'white' if grid[row, col] > vmax / 2 else 'black'
+            draw.text((left + (col + 0.5) * cell_size, top + (row + 0.5) * cell_size), str(int(grid[row, col])),
+                      font=annot_font, fill=color, anchor='mm')
+
+    #Color bar from 1 to vmax, the days without any message get their own grey square below it
+    bar_left = left + grid_width + cell_size
+    bar_height = min(grid_height - cell_size, cell_size * 16)
+    bar_values = np.linspace(vmax, 1, bar_height)
+    bar = np.repeat(calendar_colors(bar_values, vmax)[:, np.newaxis], cell_size // 2, axis=1)
+    img.paste(Image.fromarray(bar), (bar_left, top))
+    for tick in np.unique(np.linspace(1, vmax, 5).astype(int)):
+        y = top + (vmax - tick) / max(vmax - 1, 1) * (bar_height - 1)
+        draw.line([(bar_left + cell_size // 2, y), (bar_left + cell_size * 3 // 4, y)], fill='black')
+        draw.text((bar_left + cell_size, y), str(tick), font=label_font, fill='black', anchor='lm')
+    empty_top = top + bar_height + cell_size // 2
+    draw.rectangle([bar_left, empty_top, bar_left + cell_size // 2 - 1, empty_top + cell_size // 2 - 1], fill=tuple(CALENDAR_LUT[0]))
+    draw.text((bar_left + cell_size, empty_top + cell_size // 4), '0', font=label_font, fill='black', anchor='lm')
+    label = Image.new('RGB', (bar_height + cell_size, cell_size), 'white')
+    ImageDraw.Draw(label).text(((bar_height + cell_size) // 2, cell_size // 2), 'Number of messages', font=year_font, fill='black', anchor='mm')
+    img.paste(label.rotate(90, expand=True), (bar_left + cell_size * 7 // 2, top))
+    img.save(name)
+
+
+#Return the calendar colors (uint8 RGB) of an array of number of messages
+def calendar_colors(values, vmax):
+    #Index 0 is only for the days without message, any other day gets at least the lightest blue
+    index = np.clip(np.ceil(values / vmax * (len(CALENDAR_LUT) - 1)), 1, len(CALENDAR_LUT) - 1).astype(int)
+    index[values <= 0] = 0
+    return CALENDAR_LUT[index]
 
 
 def make_autopct(values):
@@ -219,6 +293,16 @@ def NonLinCdict(steps, hexcol_array):
     return cdict
 
 
+#Create a custom color map because out data are not linear, we only build it once for all the heatmaps
+HEATMAP_CMAP = matplotlib.colors.LinearSegmentedColormap('custom_blue', NonLinCdict(
+    [0, 0.001, 0.25, 0.5, 0.75, 1], ['#ffffff', '#bad6eb', '#89bedc', '#539ecd', '#2b7bba', '#052647']))
+HEATMAP_LUT = HEATMAP_CMAP(np.linspace(0, 1, 256))
+#Same colors for the calendar heatmap but the days without any message are grey instead of white
+CALENDAR_LUT = np.round(HEATMAP_LUT[:, :3] * 255).astype(np.uint8)
+CALENDAR_LUT[0] = [0xeb, 0xed, 0xf0]
+CALENDAR_MAX_ANNOTATIONS = 1500
+
+
 def export_all(conv, sticker_dir, output_dir):
     exported_images = []
     fig, ax = plt.subplots()
@@ -235,6 +319,13 @@ def export_all(conv, sticker_dir, output_dir):
     #We want the heatmatp to be in the right order for the merge
     exported_images.sort()
 
+    # Message heatmap for the whole conversation
+    fig_name = output_dir + '/heatmap_calendar.png'
+    number_of_years = max(msg_day) - min(msg_day) + 1 if len(msg_day) != 0 else 0
+    title = 'Number of messages per day\n{} messages in {} years'.format(conv.number_of_messages, number_of_years)
+    create_heatmap_calendar(conv.get_message_per_day_as_dict(), title, fig_name)
+    exported_images.append(fig_name)
+
     # Message per participants pie and barplot
     title = 'Repartition of the {} messages of this conversation'.format(conv.number_of_messages)
     fig_name = output_dir + '/msg_per_participants_pie.png'